@@ -1,9 +1,14 @@
+import sys
+
 def find_attacking_lines(file_path):
     try:
-        with open(file_path, 'r') as file:
+        # Scan raw bytes with a large read buffer; matches are written
+        # straight through without decoding
+        out = sys.stdout.buffer
+        with open(file_path, 'rb', buffering=1 << 20) as file:
             for line in file:
-                if '(ATTACKING)' in line:
-                    print(line.strip())
+                if b'(ATTACKING)' in line:
+                    out.write(line)
     except FileNotFoundError:
         print(f"Error: File '{file_path}' not found.")
     except Exception as e:
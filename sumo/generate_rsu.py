@@ -4,75 +4,115 @@ Finds optimal RSU positions to ensure maximum vehicle coverage
 """
 
 import re
+import mmap
+import os
 import numpy as np
 import matplotlib.pyplot as plt
-from sklearn.cluster import KMeans
+from matplotlib.collections import PatchCollection
+from sklearn.cluster import MiniBatchKMeans
+from scipy.spatial import cKDTree
 import math
 
+try:
+    from numba import njit, prange
+except ImportError:  # Fall back to the KD-tree coverage query
+    njit = None
+
+# Initial positions: $node_(X) set X_ Y.Y
+_POS_RE = re.compile(rb'\$node_\((\d+)\) set ([XY])_ ([\d.]+)')
+# Movement commands: $ns_ at TIME "$node_(X) setdest X Y SPEED"
+# (only the destination X/Y are captured)
+_MOVE_RE = re.compile(rb'\$ns_ at [\d.]+ "\$node_\(\d+\) setdest ([\d.]+) ([\d.]+) [\d.]+"')
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _coverage_kernel(V, R, r2):
+        """Boolean mask of vehicles V (N, 2) within sqrt(r2) of any RSU in R (K, 2)"""
+        mask = np.zeros(V.shape[0], dtype=np.bool_)
+        for i in prange(V.shape[0]):
+            for k in range(R.shape[0]):
+                dx = V[i, 0] - R[k, 0]
+                dy = V[i, 1] - R[k, 1]
+                if dx * dx + dy * dy <= r2:
+                    mask[i] = True
+                    break
+        return mask
+else:
+    _coverage_kernel = None
+
 class NS2MobilityParser:
     def __init__(self, filename):
         self.filename = filename
-        self.all_positions = []      # All vehicle positions for clustering
+        self.all_positions = np.empty((0, 2), dtype=np.float32)  # (N, 2) vehicle positions for clustering
         
     def parse_mobility_file(self):
         """Parse NS2 mobility file and extract vehicle positions over time"""
         print(f"Parsing mobility file: {self.filename}")
         
         # Store temporary node positions
-        node_positions = {}  # {node_id: {'x': val, 'y': val}}
-        position_set = set()
+        node_x = {}  # {node_id: x}
+        node_y = {}  # {node_id: y}
+        initial_positions = []
+        destinations = np.empty((0, 2))
         
-        with open(self.filename, 'r') as file:
-            for line in file:
-                line = line.strip()
-                
-                # Parse initial positions: $node_(X) set X_ Y.Y
-                pos_match = re.search(r'\$node_\((\d+)\) set ([XY])_ ([\d.]+)', line)
-                if pos_match:
-                    node_id = int(pos_match.group(1))
-                    coord = pos_match.group(2)
-                    value = float(pos_match.group(3))
-                    
-                    if node_id not in node_positions:
-                        node_positions[node_id] = {}
-                    
-                    node_positions[node_id][coord.lower()] = value
-                    
-                    # If we have both x and y, add to positions
-                    if 'x' in node_positions[node_id] and 'y' in node_positions[node_id]:
-                        pos = (node_positions[node_id]['x'], node_positions[node_id]['y'])
-                        position_set.add(pos)
-                
-                # Parse movement commands: $ns_ at TIME "$node_(X) setdest X Y SPEED"
-                move_match = re.search(r'\$ns_ at ([\d.]+) "\$node_\((\d+)\) setdest ([\d.]+) ([\d.]+) ([\d.]+)"', line)
-                if move_match:
-                    time = float(move_match.group(1))
-                    node_id = int(move_match.group(2))
-                    x = float(move_match.group(3))
-                    y = float(move_match.group(4))
-                    speed = float(move_match.group(5))
+        with open(self.filename, 'rb') as file:
+            if os.fstat(file.fileno()).st_size > 0:
+                # Scan the whole memory-mapped trace instead of looping line by line
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                    # Parse initial positions: $node_(X) set X_ Y.Y
+                    for pos_match in _POS_RE.finditer(buf):
+                        node_id = int(pos_match.group(1))
+                        coords = node_x if pos_match.group(2) == b'X' else node_y
+                        coords[node_id] = float(pos_match.group(3))
+                        
+                        # If we have both x and y, add to positions
+                        if node_id in node_x and node_id in node_y:
+                            initial_positions.append((node_x[node_id], node_y[node_id]))
                     
-                    # Add destination position
-                    position_set.add((x, y))
+                    # Parse movement commands: $ns_ at TIME "$node_(X) setdest X Y SPEED"
+                    destinations = np.array(
+                        [float(value) for move in _MOVE_RE.findall(buf) for value in move]
+                    ).reshape(-1, 2)
         
-        # Convert set to list
-        self.all_positions = list(position_set)
+        # Deduplicate initial and destination positions together at cm precision:
+        # pack (x, y) in centimetres into one uint64 key per position
+        all_positions = np.vstack([np.array(initial_positions).reshape(-1, 2), destinations])
+        cm = np.rint(all_positions * 100).astype(np.uint64)
+        keys = np.unique((cm[:, 0] << np.uint64(32)) | cm[:, 1])
+        
+        self.all_positions = np.empty((len(keys), 2), dtype=np.float32)
+        self.all_positions[:, 0] = (keys >> np.uint64(32)) / 100.0
+        self.all_positions[:, 1] = (keys & np.uint64(0xFFFFFFFF)) / 100.0
         print(f"Found {len(self.all_positions)} unique vehicle positions")
         
-        if self.all_positions:
+        if len(self.all_positions) > 0:
             # Print area bounds for verification
-            positions_array = np.array(self.all_positions)
-            min_x, max_x = positions_array[:, 0].min(), positions_array[:, 0].max()
-            min_y, max_y = positions_array[:, 1].min(), positions_array[:, 1].max()
+            min_x, max_x = self.all_positions[:, 0].min(), self.all_positions[:, 0].max()
+            min_y, max_y = self.all_positions[:, 1].min(), self.all_positions[:, 1].max()
             print(f"Area bounds: X=[{min_x:.1f}, {max_x:.1f}], Y=[{min_y:.1f}, {max_y:.1f}]")
         
         return len(self.all_positions) > 0
 
 class RSUPlacementOptimizer:
-    def __init__(self, vehicle_positions, rsu_range=300):
-        self.vehicle_positions = vehicle_positions
+    def __init__(self, vehicle_positions, rsu_range=300, early_exit_pct=100.0):
+        # Vehicle positions as a contiguous (N, 2) float32 array, shared by all strategies
+        self.V = np.ascontiguousarray(vehicle_positions, dtype=np.float32).reshape(-1, 2)
         self.rsu_range = rsu_range
+        self._r2 = float(rsu_range) ** 2  # Squared range, so distance tests skip sqrt
         self.best_rsu_positions = []
+        # Coverage (%) at which the search stops trying further strategies/moves;
+        # the default only stops once every vehicle is covered
+        self.early_exit_pct = early_exit_pct
+        
+        if _coverage_kernel is not None:
+            # Warm up the JIT so the first strategy isn't charged for compilation
+            _coverage_kernel(self.V[:1], np.zeros((1, 2)), 0.0)
+            self._tree = None
+        else:
+            self._tree = cKDTree(self.V)
+        
+        # Fitted k-means centroids by num_rsus, reused by coverage_optimization
+        self._kmeans_cache = {}
         
     def find_optimal_rsu_positions(self, num_rsus=20):
         """Find optimal RSU positions using multiple strategies"""
@@ -80,7 +120,7 @@ class RSUPlacementOptimizer:
         print(f"\n=== RSU PLACEMENT OPTIMIZATION ===")
         print(f"Target RSUs: {num_rsus}")
         print(f"RSU Range: {self.rsu_range}m")
-        print(f"Vehicle positions to cover: {len(self.vehicle_positions)}")
+        print(f"Vehicle positions to cover: {len(self.V)}")
         
         strategies = [
             ("K-Means Clustering", self.kmeans_placement),
@@ -108,6 +148,10 @@ class RSUPlacementOptimizer:
             except Exception as e:
                 print(f"Error in {strategy_name}: {e}")
                 continue
+            
+            if best_coverage >= self.early_exit_pct:
+                print(f"Reached {self.early_exit_pct:.2f}% target, skipping remaining strategies")
+                break
         
         self.best_rsu_positions = best_positions
         print(f"\n*** BEST STRATEGY: {best_strategy} ***")
@@ -117,21 +161,30 @@ class RSUPlacementOptimizer:
     
     def kmeans_placement(self, num_rsus):
         """Use K-means clustering to find RSU positions"""
-        if len(self.vehicle_positions) < num_rsus:
-            print(f"Warning: Only {len(self.vehicle_positions)} positions available for {num_rsus} RSUs")
-            return [[pos[0], pos[1]] for pos in self.vehicle_positions]
+        if len(self.V) < num_rsus:
+            print(f"Warning: Only {len(self.V)} positions available for {num_rsus} RSUs")
+            return self.V.tolist()
         
-        kmeans = KMeans(n_clusters=num_rsus, random_state=42, n_init=10)
-        positions_array = np.array(self.vehicle_positions)
-        kmeans.fit(positions_array)
+        if num_rsus not in self._kmeans_cache:
+            kmeans = MiniBatchKMeans(
+                n_clusters=num_rsus,
+                init='k-means++',
+                batch_size=min(1024, len(self.V)),
+                n_init=3,
+                tol=1e-3,
+                random_state=42
+            )
+            kmeans.fit(self.V)
+            self._kmeans_cache[num_rsus] = kmeans.cluster_centers_
         
-        return kmeans.cluster_centers_.tolist()
+        # Fresh list each call so callers can't mutate the cached centroids
+        return self._kmeans_cache[num_rsus].tolist()
     
     def grid_placement(self, num_rsus):
         """Place RSUs in a grid pattern over the area"""
-        positions_array = np.array(self.vehicle_positions)
-        min_x, max_x = positions_array[:, 0].min(), positions_array[:, 0].max()
-        min_y, max_y = positions_array[:, 1].min(), positions_array[:, 1].max()
+        # Promote the float32 bounds so the placement grid is computed in float64
+        min_x, max_x = float(self.V[:, 0].min()), float(self.V[:, 0].max())
+        min_y, max_y = float(self.V[:, 1].min()), float(self.V[:, 1].max())
         
         # Add padding to ensure coverage at edges
         padding = self.rsu_range * 0.3
@@ -140,33 +193,24 @@ class RSUPlacementOptimizer:
         min_y -= padding
         max_y += padding
         
-        # Calculate grid dimensions
-        grid_size = math.ceil(math.sqrt(num_rsus))
+        # Calculate grid dimensions: exact integer ceil(sqrt(num_rsus))
+        grid_size = math.isqrt(max(num_rsus - 1, 0)) + 1
         
-        x_step = (max_x - min_x) / max(1, grid_size - 1)
-        y_step = (max_y - min_y) / max(1, grid_size - 1)
+        # Column-major grid (x outer, y inner), truncated to num_rsus points
+        xs = np.linspace(min_x, max_x, grid_size)
+        ys = np.linspace(min_y, max_y, grid_size)
+        positions = np.stack(np.meshgrid(xs, ys, indexing='ij'), axis=-1).reshape(-1, 2)[:num_rsus]
         
-        positions = []
-        for i in range(grid_size):
-            for j in range(grid_size):
-                if len(positions) >= num_rsus:
-                    break
-                x = min_x + i * x_step
-                y = min_y + j * y_step
-                positions.append([x, y])
-            if len(positions) >= num_rsus:
-                break
-        
-        return positions[:num_rsus]
+        return positions.tolist()
     
     def density_placement(self, num_rsus):
         """Place RSUs in high-density vehicle areas"""
-        positions_array = np.array(self.vehicle_positions)
-        min_x, max_x = positions_array[:, 0].min(), positions_array[:, 0].max()
-        min_y, max_y = positions_array[:, 1].min(), positions_array[:, 1].max()
+        # Promote the float32 bounds so the placement grid is computed in float64
+        min_x, max_x = float(self.V[:, 0].min()), float(self.V[:, 0].max())
+        min_y, max_y = float(self.V[:, 1].min()), float(self.V[:, 1].max())
         
         # Create grid for density calculation
-        grid_resolution = min(50, int(math.sqrt(len(self.vehicle_positions))))
+        grid_resolution = min(50, int(math.sqrt(len(self.V))))
         
         try:
             x_bins = np.linspace(min_x, max_x, grid_resolution)
@@ -174,20 +218,19 @@ class RSUPlacementOptimizer:
             
             # Calculate density histogram
             hist, x_edges, y_edges = np.histogram2d(
-                positions_array[:, 0], positions_array[:, 1], 
+                self.V[:, 0], self.V[:, 1], 
                 bins=[x_bins, y_bins]
             )
             
-            # Find top density locations
-            flat_indices = np.argsort(hist.flatten())[-num_rsus:]
+            # Find top density locations (partial selection, no full sort)
+            top_k = min(num_rsus, hist.size)
+            flat_indices = np.argpartition(hist.ravel(), -top_k)[-top_k:]
             row_indices, col_indices = np.unravel_index(flat_indices, hist.shape)
             
-            positions = []
-            for i, j in zip(row_indices, col_indices):
-                if i < len(x_edges)-1 and j < len(y_edges)-1:
-                    x = (x_edges[i] + x_edges[i+1]) / 2
-                    y = (y_edges[j] + y_edges[j+1]) / 2
-                    positions.append([x, y])
+            # Bin centres of the selected cells
+            x = 0.5 * (x_edges[row_indices] + x_edges[row_indices + 1])
+            y = 0.5 * (y_edges[col_indices] + y_edges[col_indices + 1])
+            positions = np.stack([x, y], axis=1).tolist()
             
             # If we don't have enough positions, fill with grid placement
             while len(positions) < num_rsus:
@@ -207,36 +250,47 @@ class RSUPlacementOptimizer:
         try:
             # Start with k-means
             initial_positions = self.kmeans_placement(num_rsus)
-            best_positions = [pos[:] for pos in initial_positions]  # Deep copy
+            best_positions = np.array(initial_positions, dtype=np.float64).reshape(-1, 2)
             best_coverage = self.calculate_coverage(initial_positions)
             
             print(f"Starting coverage optimization from {best_coverage:.2f}%")
             
+            # Per-RSU coverage masks (K, N) and how many RSUs cover each vehicle,
+            # so a candidate move of one RSU is scored in O(N) instead of O(N*K)
+            in_range = np.array([self._in_range(pos) for pos in best_positions]).reshape(-1, len(self.V))
+            cover_count = in_range.sum(axis=0)
+            
             # Iterative improvement (limited iterations for performance)
             for iteration in range(5):
+                if best_coverage >= self.early_exit_pct:
+                    break
+                
                 improved = False
                 
+                # Uncovered vehicles only change when a move is accepted, which
+                # ends this pass, so look them up once per iteration
+                uncovered = self.V[cover_count == 0]
+                if len(uncovered) == 0:
+                    break
+                
+                # Try up to 3 uncovered positions
+                test_positions = uncovered[:3]
+                
                 for i in range(len(best_positions)):
-                    # Try moving each RSU to improve coverage
-                    original_pos = best_positions[i][:]
-                    
-                    # Try positions near uncovered vehicles
-                    uncovered = self.find_uncovered_vehicles(best_positions)
-                    if uncovered and len(uncovered) > 0:
-                        # Try up to 3 uncovered positions
-                        test_positions = uncovered[:min(3, len(uncovered))]
-                        
-                        for vehicle_pos in test_positions:
-                            test_rsu_positions = [pos[:] for pos in best_positions]  # Deep copy
-                            test_rsu_positions[i] = [vehicle_pos[0], vehicle_pos[1]]
-                            
-                            coverage = self.calculate_coverage(test_rsu_positions)
-                            if coverage > best_coverage:
-                                best_coverage = coverage
-                                best_positions = test_rsu_positions
-                                improved = True
-                                print(f"Iteration {iteration}: Improved to {coverage:.2f}%")
-                                break
+                    # Try moving each RSU to positions near uncovered vehicles
+                    for vehicle_pos in test_positions:
+                        # Covered by one of the other RSUs, or by RSU i at its new spot
+                        new_in_range = self._in_range(vehicle_pos)
+                        covered = ((cover_count - in_range[i]) > 0) | new_in_range
+                        coverage = 100.0 * covered.sum() / len(self.V)
+                        if coverage > best_coverage:
+                            best_coverage = coverage
+                            best_positions[i] = vehicle_pos
+                            cover_count += new_in_range.astype(cover_count.dtype) - in_range[i]
+                            in_range[i] = new_in_range
+                            improved = True
+                            print(f"Iteration {iteration}: Improved to {coverage:.2f}%")
+                            break
                     
                     if improved:
                         break
@@ -244,82 +298,69 @@ class RSUPlacementOptimizer:
                 if not improved:
                     break
             
-            return best_positions
+            return best_positions.tolist()
             
         except Exception as e:
             print(f"Coverage optimization failed: {e}, falling back to k-means")
             return self.kmeans_placement(num_rsus)
     
+    def _in_range(self, rsu_pos):
+        """Boolean mask of vehicles within range of a single RSU"""
+        d2 = ((self.V - np.asarray(rsu_pos, dtype=np.float64)) ** 2).sum(axis=1)
+        return d2 <= self._r2
+    
+    def _covered_mask(self, rsu_positions):
+        """Boolean mask of vehicles within range of at least one RSU"""
+        R = np.asarray(rsu_positions, dtype=np.float64).reshape(-1, 2)
+        
+        if _coverage_kernel is not None:
+            return _coverage_kernel(self.V, R, self._r2)
+        
+        # Range query per RSU on the vehicle KD-tree, unioned into one mask
+        mask = np.zeros(len(self.V), dtype=bool)
+        for idx in self._tree.query_ball_point(R, r=self.rsu_range):
+            mask[idx] = True
+        return mask
+    
     def calculate_coverage(self, rsu_positions):
         """Calculate percentage of vehicles covered by RSUs"""
-        if not rsu_positions or not self.vehicle_positions:
+        if len(rsu_positions) == 0 or len(self.V) == 0:
             return 0.0
         
-        covered_vehicles = 0
-        total_vehicles = len(self.vehicle_positions)
-        
-        for vehicle_pos in self.vehicle_positions:
-            is_covered = False
-            for rsu_pos in rsu_positions:
-                distance = math.sqrt(
-                    (vehicle_pos[0] - rsu_pos[0])**2 + 
-                    (vehicle_pos[1] - rsu_pos[1])**2
-                )
-                if distance <= self.rsu_range:
-                    is_covered = True
-                    break
-            
-            if is_covered:
-                covered_vehicles += 1
-        
-        return (covered_vehicles / total_vehicles) * 100 if total_vehicles > 0 else 0
+        covered_vehicles = int(self._covered_mask(rsu_positions).sum())
+        return 100.0 * covered_vehicles / len(self.V)
     
     def find_uncovered_vehicles(self, rsu_positions):
         """Find vehicles not covered by current RSU placement"""
-        uncovered = []
+        if len(rsu_positions) == 0:
+            return self.V.tolist()
         
-        for vehicle_pos in self.vehicle_positions:
-            is_covered = False
-            for rsu_pos in rsu_positions:
-                distance = math.sqrt(
-                    (vehicle_pos[0] - rsu_pos[0])**2 + 
-                    (vehicle_pos[1] - rsu_pos[1])**2
-                )
-                if distance <= self.rsu_range:
-                    is_covered = True
-                    break
-            
-            if not is_covered:
-                uncovered.append(vehicle_pos)
-        
-        return uncovered
+        mask = self._covered_mask(rsu_positions)
+        return self.V[~mask].tolist()
     
     def generate_cpp_positions(self, positions):
         """Generate C++ code for RSU positions"""
-        cpp_code = "// Optimized RSU Positions\n"
-        cpp_code += "std::vector<RSUPosition> allRSUs = {\n"
+        parts = ["// Optimized RSU Positions\n", "std::vector<RSUPosition> allRSUs = {\n"]
         
-        for i, pos in enumerate(positions):
-            x, y = pos[0], pos[1]
-            cpp_code += f'    {{{i}, Vector({x:.2f}, {y:.2f}, 0.0), "RSU-{i}"}}'
-            if i < len(positions) - 1:
-                cpp_code += ","
-            cpp_code += "\n"
+        last = len(positions) - 1
+        parts.extend(
+            f'    {{{i}, Vector({pos[0]:.2f}, {pos[1]:.2f}, 0.0), "RSU-{i}"}}{"," if i < last else ""}\n'
+            for i, pos in enumerate(positions)
+        )
         
-        cpp_code += "};\n"
-        return cpp_code
+        parts.append("};\n")
+        return "".join(parts)
     
     def save_simple_visualization(self):
         """Create a simple text-based visualization"""
-        if not self.best_rsu_positions or not self.vehicle_positions:
+        if not self.best_rsu_positions or len(self.V) == 0:
             return
         
         try:
             plt.figure(figsize=(15, 12))
             
             # Plot vehicle positions
-            vehicle_array = np.array(self.vehicle_positions)
-            plt.scatter(vehicle_array[:, 0], vehicle_array[:, 1], 
+            plt.scatter(self.V[:, 0], self.V[:, 1], 
                        c='blue', alpha=0.6, s=10, label='Vehicle Positions')
             
             # Plot RSU positions and coverage
@@ -327,12 +368,13 @@ class RSUPlacementOptimizer:
             plt.scatter(rsu_array[:, 0], rsu_array[:, 1], 
                        c='red', s=200, marker='^', label='RSU Positions')
             
-            # Draw coverage circles
-            for i, pos in enumerate(self.best_rsu_positions):
-                x, y = pos[0], pos[1]
-                circle = plt.Circle((x, y), self.rsu_range, 
-                                  fill=False, color='red', alpha=0.3, linestyle='--')
-                plt.gca().add_patch(circle)
+            # Draw coverage circles as a single collection
+            circles = [plt.Circle((x, y), self.rsu_range) for x, y in rsu_array]
+            plt.gca().add_collection(PatchCollection(
+                circles, facecolor='none', edgecolor='red', alpha=0.3, linestyle='--'
+            ))
+            
+            for i, (x, y) in enumerate(rsu_array):
                 plt.annotate(f'RSU-{i}', (x, y), xytext=(5, 5), 
                             textcoords='offset points', fontsize=8)
             
@@ -343,7 +385,7 @@ class RSUPlacementOptimizer:
             plt.grid(True, alpha=0.3)
             plt.axis('equal')
             
-            plt.savefig('rsu_placement_optimization.png', dpi=300, bbox_inches='tight')
+            plt.savefig('rsu_placement_optimization.png', dpi=150, bbox_inches='tight')
             print("Visualization saved as 'rsu_placement_optimization.png'")
             
         except Exception as e:
@@ -364,7 +406,7 @@ def main():
     parser = NS2MobilityParser(MOBILITY_FILE)
     success = parser.parse_mobility_file()
     
-    if not success or not parser.all_positions:
+    if not success or len(parser.all_positions) == 0:
         print("ERROR: No vehicle positions found in mobility file!")
         print("Make sure the file exists and contains valid NS2 mobility commands")
         return